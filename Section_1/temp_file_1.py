@@ -1,3 +1,23 @@
+from copy import deepcopy, copy
+
+TRANSFER_TEMPLATE = "Transfer {quantity} from '{source}' to '{destination}'."
+REMOVE_SUBSTANCE_TEMPLATE = "Remove {what} from '{destination}'."
+REMOVE_CLASS_TEMPLATE = "Remove all {what} from '{destination}'."
+# recipe steps are only added through these, so a baked recipe swaps them for Recipe._locked
+_BUILDER_METHODS = ('start_stage', 'end_stage', 'uses', 'transfer', 'create_container', 'create_solution',
+                    'create_solution_from', 'remove', 'dilute', 'fill_to')
+
+
+def _name_of(obj: Container | Plate | PlateSlicer) -> str:
+    """ Returns the name of the Container or Plate that obj refers to. """
+    return obj.plate.name if isinstance(obj, PlateSlicer) else obj.name
+
+
+def _well_totals(wells: np.ndarray, well_total) -> np.ndarray:
+    """ Applies well_total to each well in a single pass. Returns a float array shaped like wells. """
+    return np.fromiter((well_total(well) for well in wells.flat), dtype=float, count=wells.size).reshape(wells.shape)
+
+
 class Recipe:
     """
     A list of instructions for transforming one set of containers into another. The intended workflow is to declare
@@ -12,6 +32,7 @@ class Recipe:
         used (list): A list of Containers and Plates to be used in the recipe.
         results (dict): A dictionary used in bake to return the mutated objects.
         stages (dict): A dictionary of stages in the recipe.
+        steps_by_substance (dict): Indices of the steps that use each substance, filled in by bake().
     """
 
 
@@ -19,11 +40,29 @@ class Recipe:
     def __init__(self):
         self.results: dict[str, Container | Plate | PlateSlicer] = {}
         self.steps: list[RecipeStep] = []
-        self.stages: dict[str, slice] = {'all': slice(None, None)}
+        self.stages: dict[str, tuple[int, int | None]] = {'all': (0, None)}
         self.current_stage = 'all'
         self.current_stage_start = 0
         self.locked = False
         self.used = set()
+        self.steps_by_substance: dict[Substance, list[int]] = {}
+        # address labels ('A1', ...) of every well, per plate name, built the first time bake() fills that plate
+        self._well_addresses: dict[str, np.ndarray] = {}
+
+
+
+
+
+
+
+    def _stage_range(self, stage: str) -> range:
+        """ Returns the range of step indices covered by stage. 'all' always spans every step. """
+        start, end = self.stages[stage]
+        return range(start, len(self.steps) if end is None else end)
+
+    def _locked(self, *args, **kwargs) -> None:
+        """ Stands in for every builder method once the recipe has been baked. """
+        raise RuntimeError("This recipe is locked.")
 
 
 
@@ -37,8 +76,6 @@ class Recipe:
             name: Name of the stage.
 
         """
-        if self.locked:
-            raise RuntimeError("This recipe is locked.")
         if name in self.stages:
             raise ValueError("Stage name already exists.")
         if self.current_stage != 'all':
@@ -58,12 +95,10 @@ class Recipe:
             name: Name of the stage.
 
         """
-        if self.locked:
-            raise RuntimeError("This recipe is locked.")
         if self.current_stage != name:
             raise ValueError("Current stage does not match name.")
 
-        self.stages[name] = slice(self.current_stage_start, len(self.steps))
+        self.stages[name] = (self.current_stage_start, len(self.steps))
         self.current_stage = 'all'
 
 
@@ -74,21 +109,22 @@ class Recipe:
         """
         Declare *args (iterable of Containers and Plates) as being used in the recipe.
         """
-        if self.locked:
-            raise RuntimeError("This recipe is locked.")
+        # validate everything first, then copy and insert all of the new objects in one update
+        new_objects = {}
         for arg in args:
             if isinstance(arg, (Container, Plate)):
-                if arg.name not in self.results:
-                    self.results[arg.name] = deepcopy(arg)
-                else:
-                    raise ValueError(f"An object with the name: \"{arg.name}\" is already in use.")
+                unpacked = (arg,)
             elif isinstance(arg, Iterable):
                 unpacked = list(arg)
                 if not all(isinstance(elem, (Container, Plate)) for elem in unpacked):
                     raise TypeError("Invalid type in iterable.")
-                self.uses(*unpacked)
             else:
                 raise TypeError("Invalid type.")
+            for elem in unpacked:
+                if elem.name in self.results or elem.name in new_objects:
+                    raise ValueError(f"An object with the name: \"{elem.name}\" is already in use.")
+                new_objects[elem.name] = elem
+        self.results.update((name, deepcopy(elem)) for name, elem in new_objects.items())
         return self
 
 
@@ -102,15 +138,13 @@ class Recipe:
         Note that all Substances in the source will be transferred in proportion to their respective ratios.
 
         """
-        if self.locked:
-            raise RuntimeError("This recipe is locked.")
         if not isinstance(destination, (Container, Plate, PlateSlicer)):
             raise TypeError("Invalid destination type.")
         if not isinstance(source, (Container, Plate, PlateSlicer)):
             raise TypeError("Invalid source type.")
-        if (source.plate.name if isinstance(source, PlateSlicer) else source.name) not in self.results:
+        if _name_of(source) not in self.results:
             raise ValueError("Source not found in declared uses.")
-        destination_name = destination.plate.name if isinstance(destination, PlateSlicer) else destination.name
+        destination_name = _name_of(destination)
         if destination_name not in self.results:
             raise ValueError(f"Destination {destination_name} has not been previously declared for use.")
         if not isinstance(quantity, str):
@@ -119,7 +153,11 @@ class Recipe:
             source = source[:]
         if isinstance(destination, Plate):
             destination = destination[:]
-        self.steps.append(RecipeStep(self, 'transfer', source, destination, quantity))
+        step = RecipeStep(self, 'transfer', source, destination, quantity)
+        # PlateSlicers are described by their slice, Containers by their name
+        step.source_repr = str(source) if isinstance(source, PlateSlicer) else source.name
+        step.destination_repr = str(destination) if isinstance(destination, PlateSlicer) else destination.name
+        self.steps.append(step)
 
 
 
@@ -139,8 +177,6 @@ class Recipe:
         Returns:
             A new Container so that it may be used in later recipe steps.
         """
-        if self.locked:
-            raise RuntimeError("This recipe is locked.")
         if not isinstance(name, str):
             raise TypeError("Name must be a str.")
         if not isinstance(max_volume, str):
@@ -149,9 +185,12 @@ class Recipe:
         if initial_contents:
             if not isinstance(initial_contents, Iterable):
                 raise TypeError("Initial contents must be iterable.")
-            if not all(isinstance(elem, tuple) and len(elem) == 2 for elem in initial_contents):
-                raise TypeError("Elements of initial_contents must be of the form (Substance, quantity.)")
-            for substance, quantity in initial_contents:
+            # materialize once so that generators survive validation and can still be handed to the step
+            initial_contents = list(initial_contents)
+            for elem in initial_contents:
+                if not isinstance(elem, tuple) or len(elem) != 2:
+                    raise TypeError("Elements of initial_contents must be of the form (Substance, quantity.)")
+                substance, quantity = elem
                 if not isinstance(substance, Substance):
                     raise TypeError("Containers can only be created from substances.")
                 if not isinstance(quantity, str):
@@ -283,14 +322,11 @@ class Recipe:
             what: What to remove. Can be a type of substance or a specific substance. Defaults to LIQUID.
         """
 
-        if isinstance(destination, PlateSlicer):
-            if destination.plate.name not in self.results:
-                raise ValueError(f"Destination {destination.plate.name} has not been previously declared for use.")
-        elif isinstance(destination, (Container, Plate)):
-            if destination.name not in self.results:
-                raise ValueError(f"Destination {destination.name} has not been previously declared for use.")
-        else:
+        if not isinstance(destination, (Container, Plate, PlateSlicer)):
             raise TypeError(f"Invalid destination type: {type(destination)}")
+        destination_name = _name_of(destination)
+        if destination_name not in self.results:
+            raise ValueError(f"Destination {destination_name} has not been previously declared for use.")
 
         self.steps.append(RecipeStep(self, 'remove', None, destination, what))
 
@@ -350,14 +386,11 @@ class Recipe:
             quantity: Desired final quantity in container.
 
         """
-        if isinstance(destination, PlateSlicer):
-            if destination.plate.name not in self.results:
-                raise ValueError(f"Destination {destination.plate.name} has not been previously declared for use.")
-        elif isinstance(destination, (Container, Plate)):
-            if destination.name not in self.results:
-                raise ValueError(f"Destination {destination.name} has not been previously declared for use.")
-        else:
+        if not isinstance(destination, (Container, Plate, PlateSlicer)):
             raise TypeError(f"Invalid destination type: {type(destination)}")
+        destination_name = _name_of(destination)
+        if destination_name not in self.results:
+            raise ValueError(f"Destination {destination_name} has not been previously declared for use.")
         if not isinstance(solvent, Substance):
             raise TypeError("Solvent must be a substance.")
         if not isinstance(quantity, str):
@@ -386,253 +419,45 @@ class Recipe:
         if self.current_stage != 'all':
             self.end_stage(self.current_stage)
 
+        operations = {
+            'create_container': self._bake_create_container,
+            'transfer': self._bake_transfer,
+            'solution': self._bake_solution,
+            'solution_from': self._bake_solution_from,
+            'remove': self._bake_remove,
+            'dilute': self._bake_dilute,
+            'fill_to': self._bake_fill_to,
+        }
+
         for step in self.steps:
             # Keep track of what was used in each step
-            for elem in step.frm + step.to:
-                if isinstance(elem, PlateSlicer):
-                    step.objects_used.add(elem.plate.name)
-                elif isinstance(elem, (Container, Plate)):
-                    step.objects_used.add(elem.name)
+            step.objects_used.update(_name_of(elem) for elem in step.frm + step.to if elem is not None)
 
             step.frm_slice = step.frm[0] if isinstance(step.frm[0], PlateSlicer) else None
             step.to_slice = step.to[0] if isinstance(step.to[0], PlateSlicer) else None
 
-            operator = step.operator
-            if operator == 'create_container':
-                dest = step.to[0]
-                dest_name = dest.name
-                step.frm.append(None)
-                max_volume, initial_contents = step.operands
-                step.to[0] = self.results[dest_name]
-                self.used.add(dest_name)
-                self.results[dest_name] = Container(dest_name, max_volume, initial_contents)
-                step.substances_used = self.results[dest_name].get_substances()
-                step.to.append(self.results[dest_name])
-                step.instructions = f"Create container '{dest_name}'."
-            elif operator == 'transfer':
-                source = step.frm[0]
-                source_name = source.plate.name if isinstance(source, PlateSlicer) else source.name
-                dest = step.to[0]
-                dest_name = dest.plate.name if isinstance(dest, PlateSlicer) else dest.name
-                quantity, = step.operands
-
-                step.instructions = f"""Transfer {quantity} from '{str(source) if isinstance(source, PlateSlicer) else
-                source_name}' to '{str(dest) if isinstance(dest, PlateSlicer) else dest_name}'."""
-
-                self.used.add(source_name)
-                self.used.add(dest_name)
-
-                # containers and such can change while baking the recipe
-                if isinstance(source, PlateSlicer):
-                    source = deepcopy(source)
-                    source.plate = self.results[source_name]
-                    step.frm[0] = source.plate
-                else:
-                    source = self.results[source_name]
-                    step.frm[0] = source
+            operations[step.operator](step)
 
-                step.substances_used = source.get_substances()
-
-                if isinstance(dest, PlateSlicer):
-                    dest = deepcopy(dest)
-                    dest.plate = self.results[dest_name]
-                    step.to[0] = dest.plate
-                else:
-                    dest = self.results[dest_name]
-                    step.to[0] = dest
-
-                if isinstance(dest, Container):
-                    source, dest = Container.transfer(source, dest, quantity)
-                elif isinstance(dest, PlateSlicer):
-                    source, dest = Plate.transfer(source, dest, quantity)
-
-                self.results[source_name] = source if not isinstance(source, PlateSlicer) else source.plate
-                self.results[dest_name] = dest if not isinstance(dest, PlateSlicer) else dest.plate
-
-                step.frm.append(self.results[source_name])
-                step.to.append(self.results[dest_name])
-            elif operator == 'solution':
-                dest = step.to[0]
-                dest_name = dest.name
-                step.frm.append(None)
-                solute, solvent, kwargs = step.operands
-                # kwargs should have two out of concentration, quantity, and total_quantity
-                if 'concentration' in kwargs and 'total_quantity' in kwargs:
-                    step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
-                    }' with a concentration of {kwargs['concentration']
-                    } and a total quantity of {kwargs['total_quantity']}."""
-                elif 'concentration' in kwargs and 'quantity' in kwargs:
-                    step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
-                    }' with a concentration of {kwargs['concentration']
-                    } and a quantity of {kwargs['quantity']}."""
-                elif 'quantity' in kwargs and 'total_quantity' in kwargs:
-                    step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
-                    }' with a total quantity of {kwargs['total_quantity']
-                    } and a quantity of {kwargs['quantity']}."""
-
-                step.to[0] = self.results[dest_name]
-                self.used.add(dest_name)
-                self.results[dest_name] = Container.create_solution(solute, solvent, dest_name, **kwargs)
-                step.substances_used = self.results[dest_name].get_substances()
-                step.to.append(self.results[dest_name])
-            elif operator == 'solution_from':
-                source = step.frm[0]
-                source_name = source.name
-                dest = step.to[0]
-                dest_name = dest.name
-                solute, concentration, solvent, quantity = step.operands
-                step.frm[0] = self.results[source_name]
-                step.to[0] = self.results[dest_name]
-                step.instructions = f"""Create {quantity} of a {concentration} solution of '{solute.name
-                }' in '{solvent.name}' from '{source_name}'."""
-                self.used.add(source_name)
-                self.used.add(dest_name)
-                source = self.results[source_name]
-                self.results[source_name], self.results[dest_name] = \
-                    Container.create_solution_from(source, solute, concentration, solvent, quantity, dest.name)
-                step.substances_used = self.results[dest_name].get_substances()
-                step.frm.append(self.results[source_name])
-                step.to.append(self.results[dest_name])
-            elif operator == 'remove':
-                dest = step.to[0]
-                step.frm.append(None)
-                what, = step.operands
-                dest_name = dest.plate.name if isinstance(dest, PlateSlicer) else dest.name
-                step.to[0] = self.results[dest_name]
-                self.used.add(dest_name)
-
-                if isinstance(dest, PlateSlicer):
-                    dest = deepcopy(dest)
-                    dest.plate = self.results[dest_name]
-                else:
-                    dest = self.results[dest_name]
-
-                if isinstance(what, Substance):
-                    step.instructions = f"Remove {what.name} from '{dest_name}'."
-                else:
-                    step.instructions = f"Remove all {Substance.classes[what]} from '{dest_name}'."
-                self.results[dest_name] = dest.remove(what)
-                step.to.append(self.results[dest_name])
-                # substances_used is everything that is in step.to[0] but not in step.to[1]
-                step.substances_used = set.difference(step.to[0].get_substances(), step.to[1].get_substances())
-                if isinstance(dest, Container):
-                    step.trash = {substance: step.to[0].contents[substance] for substance in step.substances_used}
-                else:  # Plate
-                    for well in step.to[0].wells.flatten():
-                        for substance in step.substances_used:
-                            step.trash[substance] = step.trash.get(substance, 0.) + well.contents.get(substance, 0.)
-            elif operator == 'dilute':
-                dest = step.to[0]
-                dest_name = dest.name
-                solute, concentration, solvent, new_name = step.operands
-                step.frm.append(None)
-                step.to[0] = self.results[dest_name]
-                self.used.add(dest_name)
-                self.results[dest_name] = self.results[dest_name].dilute(solute, concentration, solvent, new_name)
-                amount_added = self.results[dest_name].contents[solvent] - step.to[0].contents.get(solvent, 0)
-                amount_added = Unit.convert_from(solvent, amount_added, config.moles_storage_unit, 'L')
-                amount_added, unit = Unit.get_human_readable_unit(amount_added, 'L')
-                precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
-                step.instructions = (f"Dilute '{solute.name}' in '{dest_name}' to {concentration}" +
-                                     f" by adding {round(amount_added, precision)} {unit} of '{solvent.name}'.")
-                step.substances_used.add(solvent)
-                step.to.append(self.results[dest_name])
-            elif operator == 'fill_to':
-                dest = step.to[0]
-                dest_name = dest.plate.name if isinstance(dest, PlateSlicer) else dest.name
-                solvent, quantity = step.operands
-                step.frm.append(None)
-                step.to[0] = self.results[dest_name]
-                self.used.add(dest_name)
-                self.results[dest_name] = step.to[0].fill_to(solvent, quantity)
-                step.to.append(self.results[dest_name])
-                if isinstance(dest, Container):
-                    amount_added = self.results[dest_name].contents[solvent] - step.to[0].contents.get(solvent, 0)
-                    amount_added = Unit.convert_from(solvent, amount_added, config.moles_storage_unit, 'L')
-                    amount_added, unit = Unit.get_human_readable_unit(amount_added, 'L')
-                    precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
-                    step.instructions = (f"Fill '{dest.name}' with '{solvent.name}' up to {quantity}"
-                                         f" by adding {round(amount_added, precision)} {unit}.")
-                else:  # PlateSlicer
-                    def collapse(wells, plate):
-                        result = []
-                        row_run = col_run = None
-                        start_well = end_well = wells[0]
-                        for well in wells[1:]:
-                            if row_run is not None:
-                                if well[0] == row_run and well[1] == end_well[1] + 1:
-                                    end_well = well
-                                else:
-                                    row_run = None
-                                    result.append(
-                                        f"{plate.row_names[start_well[0]]}{plate.column_names[start_well[1]]}:"
-                                        f"{plate.row_names[end_well[0]]}{plate.column_names[end_well[1]]}")
-                                    start_well = end_well = well
-                            elif col_run is not None:
-                                if well[1] == col_run and well[0] == end_well[0] + 1:
-                                    end_well = well
-                                else:
-                                    col_run = None
-                                    result.append(
-                                        f"{plate.row_names[start_well[0]]}{plate.column_names[start_well[1]]}:"
-                                        f"{plate.row_names[end_well[0]]}{plate.column_names[end_well[1]]}")
-                                    start_well = end_well = well
-                            elif well[0] == end_well[0] and well[1] == end_well[1] + 1:
-                                end_well = well
-                                row_run = well[0]
-                            elif well[1] == end_well[1] and well[0] == end_well[0] + 1:
-                                end_well = well
-                                col_run = well[1]
-                            else:
-                                result.append(f"{plate.row_names[start_well[0]]}{plate.column_names[start_well[1]]}")
-                                start_well = end_well = well
-                        if row_run is not None or col_run is not None:
-                            result.append(f"{plate.row_names[start_well[0]]}{plate.column_names[start_well[1]]}:"
-                                          f"{plate.row_names[end_well[0]]}{plate.column_names[end_well[1]]}")
-                        if start_well == end_well:
-                            result.append(f"{plate.row_names[start_well[0]]}{plate.column_names[start_well[1]]}")
-                        return result
-
-                    amounts = dict()
-                    plate = step.to[0]
-                    for row in range(plate.n_rows):
-                        for col in range(plate.n_columns):
-                            amount_added = self.results[dest_name].wells[row, col].contents[solvent] - \
-                                           plate.wells[row, col].contents.get(solvent, 0)
-                            amount_added = Unit.convert_from(solvent, amount_added, config.moles_storage_unit, 'uL')
-                            amounts[(row, col)] = round(amount_added, config.internal_precision)
-                    max_amount = max(amounts.values())
-                    _, unit = Unit.get_human_readable_unit(max_amount / 1e6, 'L')
-                    multiplier = 1e-6 / Unit.convert_prefix_to_multiplier(unit[:-1])
-                    precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
-                    amounts_transpose = dict()
-                    for address, amount in amounts.items():
-                        amount = round(amount * multiplier, precision)
-                        if amount == 0.:
-                            continue
-                        if amount not in amounts_transpose:
-                            amounts_transpose[amount] = []
-                        amounts_transpose[amount].append(address)
-                    step.instructions = f"Fill '{dest.name}' with '{solvent.name}' up to {quantity} by adding: "
-                    amount_strings = []
-                    for amount, addresses in amounts_transpose.items():
-                        addresses = collapse(addresses, plate)
-                        amount_strings.append(f"{amount} {unit} to [{', '.join(addresses)}]")
-                    step.instructions += ', '.join(amount_strings) + "."
-
-                if isinstance(dest, PlateSlicer):
-                    dest = deepcopy(dest)
-                    dest.plate = self.results[dest_name]
-                else:
-                    dest = self.results[dest_name]
-
-                self.results[dest_name] = dest.fill_to(solvent, quantity)
-                step.substances_used.add(solvent)
-                step.to.append(self.results[dest_name])
+            # record which side(s) of the step each object is on and whether it is a plate, for the query methods
+            step.endpoints = {}
+            for side in ('to', 'frm'):
+                elem = getattr(step, side)[0]
+                if elem is not None:
+                    kind = 'plate' if isinstance(elem, Plate) else 'container'
+                    step.endpoints.setdefault(elem.name, []).append((side, kind))
 
         if len(self.used) != len(self.results):
             raise ValueError("Something declared as used wasn't used.")
+
+        # index the steps by the substances they use, so queries only visit the steps that matter
+        for i, step in enumerate(self.steps):
+            for substance in step.substances_used:
+                self.steps_by_substance.setdefault(substance, []).append(i)
+
         self.locked = True
+        # the recipe can no longer change, so replace the builders instead of checking locked on every call
+        for name in _BUILDER_METHODS:
+            setattr(self, name, self._locked)
         # All the PlateSlicers should have been resolved into Plates by now
         assert all(isinstance(elem, (Container, Plate)) for elem in self.results.values())
         return self.results
@@ -640,6 +465,256 @@ class Recipe:
 
 
 
+    def _bake_create_container(self, step: RecipeStep) -> None:
+        """ Bakes a create_container step. """
+        dest = step.to[0]
+        dest_name = dest.name
+        step.frm.append(None)
+        max_volume, initial_contents = step.operands
+        step.to[0] = self.results[dest_name]
+        self.used.add(dest_name)
+        self.results[dest_name] = Container(dest_name, max_volume, initial_contents)
+        step.substances_used = self.results[dest_name].get_substances()
+        step.to.append(self.results[dest_name])
+        step.instructions = f"Create container '{dest_name}'."
+
+
+
+
+    def _bake_transfer(self, step: RecipeStep) -> None:
+        """ Bakes a transfer step. """
+        source = step.frm[0]
+        source_name = _name_of(source)
+        dest = step.to[0]
+        dest_name = _name_of(dest)
+        quantity, = step.operands
+
+        step.instructions = TRANSFER_TEMPLATE.format(quantity=quantity, source=step.source_repr,
+                                                     destination=step.destination_repr)
+
+        self.used.add(source_name)
+        self.used.add(dest_name)
+
+        # containers and such can change while baking the recipe
+        # only the plate reference of a PlateSlicer is rebound, so a shallow copy is enough
+        if isinstance(source, PlateSlicer):
+            source = copy(source)
+            source.plate = self.results[source_name]
+            step.frm[0] = source.plate
+        else:
+            source = self.results[source_name]
+            step.frm[0] = source
+
+        step.substances_used = source.get_substances()
+
+        if isinstance(dest, PlateSlicer):
+            dest = copy(dest)
+            dest.plate = self.results[dest_name]
+            step.to[0] = dest.plate
+        else:
+            dest = self.results[dest_name]
+            step.to[0] = dest
+
+        if isinstance(dest, Container):
+            source, dest = Container.transfer(source, dest, quantity)
+        elif isinstance(dest, PlateSlicer):
+            source, dest = Plate.transfer(source, dest, quantity)
+
+        self.results[source_name] = source if not isinstance(source, PlateSlicer) else source.plate
+        self.results[dest_name] = dest if not isinstance(dest, PlateSlicer) else dest.plate
+
+        step.frm.append(self.results[source_name])
+        step.to.append(self.results[dest_name])
+
+
+
+
+    def _bake_solution(self, step: RecipeStep) -> None:
+        """ Bakes a solution step. """
+        dest = step.to[0]
+        dest_name = dest.name
+        step.frm.append(None)
+        solute, solvent, kwargs = step.operands
+        # kwargs should have two out of concentration, quantity, and total_quantity
+        if 'concentration' in kwargs and 'total_quantity' in kwargs:
+            step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
+            }' with a concentration of {kwargs['concentration']
+            } and a total quantity of {kwargs['total_quantity']}."""
+        elif 'concentration' in kwargs and 'quantity' in kwargs:
+            step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
+            }' with a concentration of {kwargs['concentration']
+            } and a quantity of {kwargs['quantity']}."""
+        elif 'quantity' in kwargs and 'total_quantity' in kwargs:
+            step.instructions = f"""Create a solution of '{solute.name}' in '{solvent.name
+            }' with a total quantity of {kwargs['total_quantity']
+            } and a quantity of {kwargs['quantity']}."""
+
+        step.to[0] = self.results[dest_name]
+        self.used.add(dest_name)
+        self.results[dest_name] = Container.create_solution(solute, solvent, dest_name, **kwargs)
+        step.substances_used = self.results[dest_name].get_substances()
+        step.to.append(self.results[dest_name])
+
+
+
+
+    def _bake_solution_from(self, step: RecipeStep) -> None:
+        """ Bakes a solution_from step. """
+        source = step.frm[0]
+        source_name = source.name
+        dest = step.to[0]
+        dest_name = dest.name
+        solute, concentration, solvent, quantity = step.operands
+        step.frm[0] = self.results[source_name]
+        step.to[0] = self.results[dest_name]
+        step.instructions = f"""Create {quantity} of a {concentration} solution of '{solute.name
+        }' in '{solvent.name}' from '{source_name}'."""
+        self.used.add(source_name)
+        self.used.add(dest_name)
+        source = self.results[source_name]
+        self.results[source_name], self.results[dest_name] = \
+            Container.create_solution_from(source, solute, concentration, solvent, quantity, dest.name)
+        step.substances_used = self.results[dest_name].get_substances()
+        step.frm.append(self.results[source_name])
+        step.to.append(self.results[dest_name])
+
+
+
+
+    def _bake_remove(self, step: RecipeStep) -> None:
+        """ Bakes a remove step. """
+        dest = step.to[0]
+        step.frm.append(None)
+        what, = step.operands
+        dest_name = _name_of(dest)
+        step.to[0] = self.results[dest_name]
+        self.used.add(dest_name)
+
+        if isinstance(dest, PlateSlicer):
+            dest = copy(dest)
+            dest.plate = self.results[dest_name]
+        else:
+            dest = self.results[dest_name]
+
+        if isinstance(what, Substance):
+            step.instructions = REMOVE_SUBSTANCE_TEMPLATE.format(what=what.name, destination=dest_name)
+        else:
+            step.instructions = REMOVE_CLASS_TEMPLATE.format(what=Substance.classes[what], destination=dest_name)
+        self.results[dest_name] = dest.remove(what)
+        step.to.append(self.results[dest_name])
+        # substances_used is everything that is in step.to[0] but not in step.to[1]
+        step.substances_used = set.difference(step.to[0].get_substances(), step.to[1].get_substances())
+        if isinstance(dest, Container):
+            step.trash = {substance: step.to[0].contents[substance] for substance in step.substances_used}
+        else:  # Plate
+            for well in step.to[0].wells.flatten():
+                for substance in step.substances_used:
+                    step.trash[substance] = step.trash.get(substance, 0.) + well.contents.get(substance, 0.)
+
+
+
+
+    def _bake_dilute(self, step: RecipeStep) -> None:
+        """ Bakes a dilute step. """
+        dest = step.to[0]
+        dest_name = dest.name
+        solute, concentration, solvent, new_name = step.operands
+        step.frm.append(None)
+        step.to[0] = self.results[dest_name]
+        self.used.add(dest_name)
+        self.results[dest_name] = self.results[dest_name].dilute(solute, concentration, solvent, new_name)
+        amount_added = self.results[dest_name].contents[solvent] - step.to[0].contents.get(solvent, 0)
+        amount_added = Unit.convert_from(solvent, amount_added, config.moles_storage_unit, 'L')
+        amount_added, unit = Unit.get_human_readable_unit(amount_added, 'L')
+        precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
+        step.instructions = (f"Dilute '{solute.name}' in '{dest_name}' to {concentration}" +
+                             f" by adding {round(amount_added, precision)} {unit} of '{solvent.name}'.")
+        step.substances_used.add(solvent)
+        step.to.append(self.results[dest_name])
+
+
+
+
+    def _bake_fill_to(self, step: RecipeStep) -> None:
+        """ Bakes a fill_to step. """
+        dest = step.to[0]
+        dest_name = _name_of(dest)
+        solvent, quantity = step.operands
+        step.frm.append(None)
+        step.to[0] = self.results[dest_name]
+        self.used.add(dest_name)
+        self.results[dest_name] = step.to[0].fill_to(solvent, quantity)
+        step.to.append(self.results[dest_name])
+        if isinstance(dest, Container):
+            amount_added = self.results[dest_name].contents[solvent] - step.to[0].contents.get(solvent, 0)
+            amount_added = Unit.convert_from(solvent, amount_added, config.moles_storage_unit, 'L')
+            amount_added, unit = Unit.get_human_readable_unit(amount_added, 'L')
+            precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
+            step.instructions = (f"Fill '{dest.name}' with '{solvent.name}' up to {quantity}"
+                                 f" by adding {round(amount_added, precision)} {unit}.")
+        else:  # PlateSlicer
+            def collapse(wells, addresses):
+                # single pass over the wells, extending a run along a row (axis 0) or a column (axis 1)
+                result = []
+                start = end = wells[0]
+                axis = None
+                for well in wells[1:]:
+                    if axis != 1 and well[0] == end[0] and well[1] == end[1] + 1:
+                        axis = 0
+                    elif axis != 0 and well[1] == end[1] and well[0] == end[0] + 1:
+                        axis = 1
+                    else:
+                        result.append(addresses[start] if axis is None else f"{addresses[start]}:{addresses[end]}")
+                        start = well
+                        axis = None
+                    end = well
+                result.append(addresses[start] if axis is None else f"{addresses[start]}:{addresses[end]}")
+                return result
+
+            plate = step.to[0]
+            before = np.array([[well.contents.get(solvent, 0) for well in row] for row in plate.wells], dtype=float)
+            after = np.array([[well.contents.get(solvent, 0) for well in row]
+                              for row in self.results[dest_name].wells], dtype=float)
+            # converting an amount of solvent to a volume is linear, so one factor covers every well. most wells get
+            # one of a few amounts, so each distinct amount is converted and rounded once, with Python's round(),
+            # which rounds the exact decimal where np.round scales first and can land the other way on ties
+            factor = Unit.convert_from(solvent, 1., config.moles_storage_unit, 'uL')
+            deltas, inverse = np.unique((after - before).ravel(), return_inverse=True)
+            volumes = [round(delta * factor, config.internal_precision) for delta in deltas.tolist()]
+            _, unit = Unit.get_human_readable_unit(max(volumes) / 1e6, 'L')
+            multiplier = 1e-6 / Unit.convert_prefix_to_multiplier(unit[:-1])
+            precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
+            amounts = [round(volume * multiplier, precision) for volume in volumes]
+            # group the wells by amount in a single pass, keeping the order in which each amount first appears
+            amounts_transpose = dict()
+            for well, index in zip(np.ndindex(before.shape), inverse.tolist()):
+                amount = amounts[index]
+                if amount != 0.:
+                    amounts_transpose.setdefault(amount, []).append(well)
+            step.instructions = f"Fill '{dest.name}' with '{solvent.name}' up to {quantity} by adding: "
+            if plate.name not in self._well_addresses:
+                self._well_addresses[plate.name] = np.array([[f"{row}{col}" for col in plate.column_names]
+                                                             for row in plate.row_names], dtype=object)
+            well_addresses = self._well_addresses[plate.name]
+            amount_strings = []
+            for amount, addresses in amounts_transpose.items():
+                addresses = collapse(addresses, well_addresses)
+                amount_strings.append(f"{amount} {unit} to [{', '.join(addresses)}]")
+            step.instructions += ', '.join(amount_strings) + "."
+
+        if isinstance(dest, PlateSlicer):
+            dest = copy(dest)
+            dest.plate = self.results[dest_name]
+        else:
+            dest = self.results[dest_name]
+
+        self.results[dest_name] = dest.fill_to(solvent, quantity)
+        step.substances_used.add(solvent)
+        step.to.append(self.results[dest_name])
+
+
+
+
 [docs]
     def get_substance_used(self, substance: Substance, timeframe: str = 'all', unit: str = None,
                            destinations: Iterable[Container | Plate] | str = "plates"):
@@ -677,24 +752,33 @@ class Recipe:
         if timeframe not in self.stages.keys():
             raise ValueError("Invalid timeframe")
 
-        stage_steps = self.steps[self.stages[timeframe]]
-        for step in stage_steps:
-            if substance not in step.substances_used:
+        # a plate snapshot is usually both the result of one step and the start of the next, so sum each one once
+        plate_totals = {}
+
+        def plate_total(plate):
+            if id(plate) not in plate_totals:
+                plate_totals[id(plate)] = sum(well.contents.get(substance, 0) for well in plate.wells.flat)
+            return plate_totals[id(plate)]
+
+        stage_range = self._stage_range(timeframe)
+        for i in self.steps_by_substance.get(substance, ()):
+            if i not in stage_range:
                 continue
+            step = self.steps[i]
 
             before_substances = 0
             after_substances = 0
             if step.to[0] is not None and step.to[0].name in dest_names:
                 if isinstance(step.to[0], Plate):
-                    before_substances += sum(well.contents.get(substance, 0) for well in step.to[0].wells.flatten())
-                    after_substances += sum(well.contents.get(substance, 0) for well in step.to[1].wells.flatten())
+                    before_substances += plate_total(step.to[0])
+                    after_substances += plate_total(step.to[1])
                 else:  # Container
                     before_substances += step.to[0].contents.get(substance, 0)
                     after_substances += step.to[1].contents.get(substance, 0)
             if step.frm[0] is not None and step.frm[0].name in dest_names:
                 if isinstance(step.frm[0], Plate):
-                    before_substances += sum(well.contents.get(substance, 0) for well in step.frm[0].wells.flatten())
-                    after_substances += sum(well.contents.get(substance, 0) for well in step.frm[1].wells.flatten())
+                    before_substances += plate_total(step.frm[0])
+                    after_substances += plate_total(step.frm[1])
                 else:  # Container
                     before_substances += step.frm[0].contents.get(substance, 0)
                     after_substances += step.frm[1].contents.get(substance, 0)
@@ -732,6 +816,19 @@ class Recipe:
             entry = container.contents.items()
             return sum(map(helper, entry))
 
+        # total amount held by a container, or by each well of a plate, keyed by the kind recorded in step.endpoints
+        totals = {
+            'container': lambda elem: sum(map(helper, elem.contents.items())),
+            'plate': lambda elem: _well_totals(elem.wells, plate_helper),
+        }
+        # a snapshot is usually the result of one step and the start of the next, so total each one once
+        snapshot_totals = {}
+
+        def total(elem, kind):
+            if id(elem) not in snapshot_totals:
+                snapshot_totals[id(elem)] = totals[kind](elem)
+            return snapshot_totals[id(elem)]
+
         if unit is None:
             unit = config.volume_display_unit
         if not isinstance(unit, str):
@@ -742,30 +839,19 @@ class Recipe:
             raise TypeError("Timeframe must be a str.")
         if timeframe not in self.stages.keys():
             raise ValueError("Invalid Timeframe")
-        steps = self.steps[self.stages[timeframe]]
         flows = {"in": 0, "out": 0}
         if isinstance(container, Plate):
             flows = {"in": np.zeros(container.wells.shape), "out": np.zeros(container.wells.shape)}
-        for step in steps:
-            if container.name in step.objects_used:
-                if isinstance(step.to[0], Container) and step.to[0].name == container.name:
-                    if step.trash:
-                        flows["out"] += sum(map(helper, step.trash.items()))
-                    else:
-                        flows["in"] += (sum(map(helper, step.to[1].contents.items())) -
-                                        sum(map(helper, step.to[0].contents.items())))
-                if isinstance(step.to[0], Plate) and step.to[0].name == container.name:
+        for i in self._stage_range(timeframe):
+            step = self.steps[i]
+            for side, kind in step.endpoints.get(container.name, ()):
+                if side == 'to':
                     if step.trash:
                         flows["out"] += sum(map(helper, step.trash.items()))
                     else:
-                        vfunc = np.vectorize(plate_helper)
-                        flows["in"] += vfunc(step.to[1].wells) - vfunc(step.to[0].wells)
-                if isinstance(step.frm[0], Container) and step.frm[0].name == container.name:
-                    flows["out"] += (sum(map(helper, step.frm[0].contents.items())) -
-                                     sum(map(helper, step.frm[1].contents.items())))
-                if isinstance(step.frm[0], Plate) and step.frm[0].name == container.name:
-                    vfunc = np.vectorize(plate_helper)
-                    flows["out"] += vfunc(step.frm[0].wells) - vfunc(step.frm[1].wells)
+                        flows["in"] += total(step.to[1], kind) - total(step.to[0], kind)
+                else:
+                    flows["out"] += total(step.frm[0], kind) - total(step.frm[1], kind)
         precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
         for key in flows:
             flows[key] = round(flows[key], precision)
@@ -793,8 +879,7 @@ class Recipe:
                 entry = container.contents.items()
                 return sum(map(conversion_helper, entry))
             elif isinstance(container, Plate):
-                vfunc = np.vectorize(plate_helper)
-                return vfunc(container.wells)
+                return _well_totals(container.wells, plate_helper)
 
         if unit is None:
             unit = config.volume_display_unit
@@ -807,24 +892,18 @@ class Recipe:
         if timeframe not in self.stages.keys():
             raise ValueError("Invalid Timeframe")
 
-        steps = self.steps[self.stages[timeframe]]
+        indices = self._stage_range(timeframe)
         if mode == 'after':
-            steps = reversed(steps)
-
-        query_container = None
-        for step in steps:
-            if container.name in step.objects_used:
-                if step.to[0].name == container.name:
-                    if mode == 'after':
-                        query_container = step.to[1]
-                    else:
-                        query_container = step.to[0]
-                else:
-                    if mode == 'after':
-                        query_container = step.frm[1]
-                    else:
-                        query_container = step.frm[0]
-                return container_helper(query_container)
+            indices = reversed(indices)
+
+        for i in indices:
+            step = self.steps[i]
+            roles = step.endpoints.get(container.name)
+            if roles is None:
+                continue
+            side, _ = roles[0]
+            query_container = getattr(step, side)[1 if mode == 'after' else 0]
+            return container_helper(query_container)
 
 
 
@@ -864,28 +943,31 @@ class Recipe:
         if not isinstance(cmap, str):
             raise TypeError("Colormap must be a str.")
 
-        def helper(elem):
-            """ Returns amount of substance in elem. """
-            if substance == 'all':
+        if substance == 'all':
+            def helper(elem):
+                """ Returns amount of all substances in elem. """
                 amount = 0
                 for subst, quantity in elem.contents.items():
                     substance_unit = 'U' if subst.is_enzyme() else config.moles_storage_unit
                     amount += Unit.convert_from(subst, quantity, substance_unit, unit)
                 return amount
-            else:
+        else:
+            def helper(elem):
+                """ Returns amount of substance in elem. """
                 substance_unit = 'U' if substance.is_enzyme() else config.moles_storage_unit
                 return Unit.convert_from(substance, elem.contents.get(substance, 0), substance_unit, unit)
 
+        def plate_data(plate):
+            """ Returns a DataFrame of helper applied to every well of plate. """
+            return pandas.DataFrame(_well_totals(plate.wells, helper), index=plate.row_names,
+                                    columns=plate.column_names)
+
         if isinstance(timeframe, RecipeStep):
             start_index = self.steps.index(timeframe)
             end_index = start_index + 1
         elif isinstance(timeframe, str):
-            start_index = self.stages[timeframe].start
-            end_index = self.stages[timeframe].stop
-            if start_index is None:
-                start_index = 0
-            if end_index is None:
-                end_index = len(self.steps)
+            stage_range = self._stage_range(timeframe)
+            start_index, end_index = stage_range.start, stage_range.stop
         else:
             if timeframe >= len(self.steps):
                 raise ValueError("Invalid step number.")
@@ -894,42 +976,26 @@ class Recipe:
             start_index = timeframe
             end_index = timeframe + 1
 
+        # find the first and last steps in the timeframe that use the plate
         start = None
         end = None
         for i in range(start_index, end_index):
-            step = self.steps[i]
-            if what.name in step.objects_used:
-                start = i
-                break
-        for i in range(end_index - 1, start_index - 1, -1):
-            step = self.steps[i]
-            if what.name in step.objects_used:
+            if what.name in self.steps[i].objects_used:
+                if start is None:
+                    start = i
                 end = i
-                break
         if start is None or end is None:
             return "This plate was not used in the specified timeframe."
 
         if mode == 'delta':
-            before_data = None
-            if what.name == self.steps[start].frm[0].name:
-                before_data = self.steps[start].frm[0][:].get_dataframe()
-            elif what.name == self.steps[start].to[0].name:
-                before_data = self.steps[start].to[0][:].get_dataframe()
-            before_data = before_data.applymap(numpy.vectorize(helper, cache=True, otypes='d'))
-            after_data = None
-            if what.name == self.steps[end].frm[1].name:
-                after_data = self.steps[end].frm[1][:].get_dataframe()
-            elif what.name == self.steps[end].to[1].name:
-                after_data = self.steps[end].to[1][:].get_dataframe()
-            after_data = after_data.applymap(numpy.vectorize(helper, cache=True, otypes='d'))
+            side, _ = self.steps[start].endpoints[what.name][0]
+            before_data = plate_data(getattr(self.steps[start], side)[0])
+            side, _ = self.steps[end].endpoints[what.name][0]
+            after_data = plate_data(getattr(self.steps[end], side)[1])
             df = after_data - before_data
         else:
-            data = None
-            if what.name == self.steps[end].frm[1].name:
-                data = self.steps[end].frm[1][:].get_dataframe()
-            elif what.name == self.steps[end].to[1].name:
-                data = self.steps[end].to[1][:].get_dataframe()
-            df = data.applymap(numpy.vectorize(helper, cache=True, otypes='d'))
+            side, _ = self.steps[end].endpoints[what.name][0]
+            df = plate_data(getattr(self.steps[end], side)[1])
 
         precision = config.precisions[unit] if unit in config.precisions else config.precisions['default']
         df = df.round(precision)
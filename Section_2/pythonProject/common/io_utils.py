@@ -0,0 +1,40 @@
+"""
+File system helpers shared by the binary format parsers
+"""
+import os
+
+
+def datafile_paths_from_dir(path):
+    """
+    Method for returning a list of data file paths from a directory path.
+
+    :param path: Path of the directory
+
+    :return: list of all paths to files within the directory path
+    """
+    # Ensure the provided path is a directory
+    if not os.path.isdir(path):
+        raise ValueError(f"the path '{path}' is not a directory or does not exist.")
+
+    # List all files in the directory (assuming no subdirectories)
+    # scandir entries carry their file type, so this avoids a separate stat call per file
+    with os.scandir(path) as entries:
+        return [entry.path for entry in entries if entry.is_file()]
+
+
+def export_solution(df, solution_path):
+    """
+    Writes the csv solution file for a DataFile, unless it already exists.
+
+    :param df: DataFile to export
+    :param solution_path: Path of the directory holding the solution files
+
+    :return: message describing what was done with the file
+    """
+    file_name = df.name + '_solution'
+    path = os.path.join(solution_path, file_name)
+    if not os.path.exists(path):
+        df.export_csv(path)
+        return f'wrote {file_name} to {os.path.basename(solution_path)}'
+    return (f'{file_name} already exists in {os.path.basename(solution_path)}\n'
+            f'\tdelete the file to write a new one.')
@@ -1,8 +1,11 @@
 """
 Methods for parsing pear file
 
+Run from the pythonProject folder with: python -m pear.pear_main
 """
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import re
 import numpy as np
 import rainbow as rb
@@ -10,6 +13,8 @@ from rainbow.datafile import DataFile
 from rainbow.datadirectory import DataDirectory
 import pandas as pd
 
+from common.io_utils import datafile_paths_from_dir, export_solution
+
 """
 BINARY PARSING METHODS
 
@@ -28,37 +33,31 @@ def parse_pear_4(path):
         the columns correspond to the ylabels.
     """
 
-    # read most significant 4 bytes from each segment into 'raw_bytes'.
-    with open(path, 'rb') as f:
-        raw_bytes = f.read()
+    # map the file and interpret each 4-byte segment as a value. dtype must be little-endian int
+    raw_values = np.memmap(path, dtype='<i', mode='r')
 
-    # verify path and raw_bytes
+    # verify path
     # print(path)
-    # print(raw_bytes)
-
-    # calculate the 'values' from each 4-byte segment. dtype must be little-endian int
-    raw_values = np.frombuffer(raw_bytes, dtype='<i')
 
     # verify raw_values, should print 328 for sample file
     # print(raw_values[90])
 
-    # find the start of the real data by skipping the header
-    start_index = 0
-    while raw_values[start_index] == 72:
-        start_index += 1
+    # find the start of the real data by skipping the header (the first value that isn't 72)
+    not_header = raw_values != 72
+    start_index = int(np.argmax(not_header)) if not_header.any() else len(raw_values)
 
-    # find the end of the real data by skipping the footer
-    end_index = len(raw_values)
-    while raw_values[end_index - 1] == 70:
-        end_index -= 1
+    # find the end of the real data by skipping the footer (the last value that isn't 70)
+    not_footer = raw_values[::-1] != 70
+    end_index = len(raw_values) - (int(np.argmax(not_footer)) if not_footer.any() else len(raw_values))
 
     # start interpreting ints after header
     unshaped_values = raw_values[start_index:end_index]
 
-    # reshape the useful data into a 2D array with time, intensity columns
+    # reshape the useful data into a 2D array with time, intensity columns.
+    # copy it out so the result owns its data and doesn't keep the file mapped
     num_cols = 2
     num_rows = len(unshaped_values) // num_cols
-    result_array = unshaped_values[:num_rows * num_cols].reshape((num_rows, num_cols))
+    result_array = np.array(unshaped_values[:num_rows * num_cols].reshape((num_rows, num_cols)))
 
     # verify result array
     # print(result_array[:15])
@@ -67,32 +66,9 @@ def parse_pear_4(path):
     ylabels = ['intensity']
     ylabels_arr = np.array(ylabels)
 
-    # cleanup
-    del raw_values, raw_bytes, unshaped_values, ylabels
-
     return ylabels_arr, result_array
 
 
-def datafile_paths_from_dir(path):
-    """
-    Method for returning an array of data file paths from a directory path.
-
-    :param path: Path of the directory
-    :return: ndarray of all paths to files within the directory path
-    """
-    # Ensure the provided path is a directory
-    if not os.path.isdir(path):
-        raise ValueError(f'the path {path} is not a directory or does not exist.')
-
-    # List all files in the directory (assuming no subdirectories)
-    files = [os.path.join(path, f) for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-
-    # Convert the list to a ndarray
-    files_arr = np.array(files)
-
-    return files_arr
-
-
 def make_pear_datafile(path, ylabels, data):
     xlabels, intensity_data = np.hsplit(data, 2)
     xlabels = xlabels.flatten()
@@ -123,7 +99,7 @@ def main():
     :return: None
     """
     # create directory and file paths
-    cwd_path = os.getcwd()
+    cwd_path = os.path.dirname(os.path.abspath(__file__))
     datadir_path = cwd_path + '\\datadir'
     file_paths = datafile_paths_from_dir(datadir_path)
 
@@ -137,8 +113,6 @@ def main():
         print(f'making DataFile: {name}')
         data_files.append(make_pear_datafile(file_path, ylabels, data))
 
-    data_files_array = np.array(data_files)
-
     # create directory with csv files for evaluation
     solution_path = os.path.join(cwd_path, 'csv_files')
     try:
@@ -146,11 +120,14 @@ def main():
         print(f'made solution folder at ./{os.path.basename(solution_path)}')
     except FileExistsError:
         print(f"The folder '{solution_path}' already exists")
-    for df in data_files_array:
-        file_name = df.name + '_solution'
-        path = os.path.join(solution_path, file_name)
-        if not os.path.exists(path):
-            df.export_csv(path)
+    # the files are independent, so write them concurrently when there is more than one
+    export = partial(export_solution, solution_path=solution_path)
+    if len(data_files) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(data_files))) as executor:
+            list(executor.map(export, data_files))
+    else:
+        for data_file in data_files:
+            export(data_file)
 
     # TESTING WITH SAMPLE DATA
     # pear_path = os.getcwd() + '\\pear'
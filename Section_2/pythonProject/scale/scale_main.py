@@ -1,8 +1,11 @@
 """
 Script for parsing scale file
+
+Run from the pythonProject folder with: python -m scale.scale_main
 """
 import os
-import struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import re
 import numpy as np
 import rainbow as rb
@@ -10,6 +13,8 @@ from rainbow.datafile import DataFile
 from rainbow.datadirectory import DataDirectory
 import pandas as pd
 
+from common.io_utils import datafile_paths_from_dir, export_solution
+
 """
 BINARY PARSING METHODS
 
@@ -22,27 +27,6 @@ After the header, each row of data begins with two 0x48 bytes ('H' character in
 """
 
 
-def datafile_paths_from_dir(path):
-    """
-    Method for returning an array of data file paths from a directory path.
-
-    :param path: Path of the directory
-
-    :return: ndarray of all paths to files within the directory path
-    """
-    # Ensure the provided path is a directory
-    if not os.path.isdir(path):
-        raise ValueError(f"the path '{path}' is not a directory or does not exist.")
-
-    # List all files in the directory (assuming no subdirectories)
-    files = [os.path.join(path, f) for f in os.listdir(path) if os.path.isfile(os.path.join(path, f))]
-
-    # Convert the list to a ndarray
-    files_arr = np.array(files)
-
-    return files_arr
-
-
 def parse_xlabels_body(values):
     """
     Split real body values into xlabels (time) and absorbance data arrays.
@@ -55,13 +39,12 @@ def parse_xlabels_body(values):
         rows correspond to time (xlabels) and columns correspond \
         to wavelengths (ylabels).
     """
-    # split values data column-wise into xlabels (column 0) and data (the rest)
-    split = np.array([1])
-    xlabels_data, body_data = np.hsplit(values, split)
+    # split values data column-wise into xlabels (column 0) and data (the rest), as views
+    xlabels_data = values[:, 0]
+    body_data = values[:, 1:]
 
-    # convert xlabels integers into floats
-    xlabels_bytes = xlabels_data.tobytes()
-    xlabels = np.frombuffer(xlabels_bytes, dtype='>f')
+    # convert xlabels integers into floats by reinterpreting their bytes in place
+    xlabels = xlabels_data.view('>f')
     assert xlabels.size == body_data.shape[0], 'Problem when splitting xlabels and body data'
 
     return xlabels, body_data
@@ -86,7 +69,7 @@ def parse_body(data, num_cols):
     """
     Parses data body into an array of 32-bit integers.
 
-    :param data: byte data to parse
+    :param data: byte data to parse (bytes or a uint8 array such as a memmap)
     :param num_cols: number of ylabels to look for (+1 for xlabels column)
 
     :return: 2D array of [x, ...] rows and num_cols + 1 columns, where \
@@ -95,30 +78,23 @@ def parse_body(data, num_cols):
     """
     row_size = 2 + (num_cols+1)*4     # 2 bytes for 'HH', (num-cols+1)*4 bytes for the 32-bit integers
     pattern = b'HH'                   # Marker for beginning of a row
-    row_format = f'>{num_cols+1}i'               # 19 big-endian, signed, 32-bit integers
-
-    # List to hold extracted rows
-    rows = []
-
-    # Current position in data
-    pos = 0
-    while pos < len(data):
-        # Look for 'HH' marker
-        if data[pos:pos+2] == pattern:
-            # Extract the 19 integers after the 'HH' marker
-            row_data = data[pos+2:pos+row_size]
-            if len(row_data) == (num_cols+1)*4:
-                integers = struct.unpack(row_format, row_data)
-                rows.append(integers)
-            # Move to next row
-            pos += row_size
-        else:
-            # If no marker found, raise error (there should always be a marker
-            # immediately after the end of the data row
-            raise ValueError(f'Error parsing data body at pos: {hex(pos)}')
-
-    # convert list into ndarray
-    result_arr = np.array(rows, dtype=np.int32)
+    # each row is the 'HH' marker followed by num_cols+1 big-endian, signed, 32-bit integers
+    row_dtype = np.dtype([('marker', 'S2'), ('values', '>i4', (num_cols+1,))])
+
+    # view every complete row at once
+    num_rows = len(data) // row_size
+    rows = np.frombuffer(data, dtype=row_dtype, count=num_rows)
+
+    # every row must begin with the marker, including a trailing partial row (which is skipped)
+    bad_rows = np.flatnonzero(rows['marker'] != pattern)
+    if bad_rows.size:
+        raise ValueError(f'Error parsing data body at pos: {hex(int(bad_rows[0]) * row_size)}')
+    tail = bytes(data[num_rows*row_size:])
+    if len(tail) and tail[:2] != pattern:
+        raise ValueError(f'Error parsing data body at pos: {hex(num_rows * row_size)}')
+
+    # convert the big-endian values into a native ndarray
+    result_arr = rows['values'].astype(np.int32)
 
     return result_arr
 
@@ -137,19 +113,14 @@ def parse_header(values):
     ylabels_info = list of [start, end, interval] for creating a range of ylabels.
     num_rows = number of data rows in the body of the file.
     """
-    # iterate through header to find necessary data
-    results = []
-
-    # store all non-zero numbers
-    for value in values:
-        if value != 0:
-            results.append(value)
+    # keep all non-zero numbers, which hold the necessary data
+    results = values[values != 0]
 
-    if len(results) != 5:
+    if results.size != 5:
         raise ValueError('Error with parsing header')
 
     # return formatted output variables
-    return results[0], results[1:4], results[4]
+    return results[0], list(results[1:4]), results[4]
 
 
 def parse_scale_4(path):
@@ -164,13 +135,11 @@ def parse_scale_4(path):
         metadata for the file
     """
 
-    # read file
-    with open(path, 'rb') as f:
-        # read raw binary into bytes
-        raw_bytes = f.read()
+    # map the raw binary into memory instead of reading it all at once
+    raw_bytes = np.memmap(path, dtype=np.uint8, mode='r')
 
     # parse header info
-    raw_values_head = np.frombuffer(raw_bytes[:512], '>H')
+    raw_values_head = raw_bytes[:512].view('>H')
     divisor, ylabels_info, num_rows = parse_header(raw_values_head)
 
     # create ylabels
@@ -188,7 +157,7 @@ def parse_scale_4(path):
     xlabels, raw_body_data = parse_xlabels_body(raw_values_body)
 
     # map divisor over body data to convert to real data numbers
-    real_body = np.divide(raw_body_data, divisor)
+    real_body = raw_body_data / divisor
 
     # create metadata
     metadata = {
@@ -207,7 +176,7 @@ def main():
     :return: None
     """
     # create directory and file paths
-    cwd_path = os.getcwd()
+    cwd_path = os.path.dirname(os.path.abspath(__file__))
     datadir_path = cwd_path + '\\datadir'
     file_paths = datafile_paths_from_dir(datadir_path)
 
@@ -232,12 +201,14 @@ def main():
         print(f'made solution folder at ./{os.path.basename(solution_path)}')
     except FileExistsError as err:
         print(f"The folder '{solution_path}' already exists")
-    # add solution files to directory
-    for df in solution_list:
-        file_name = df.name + '_solution'
-        path = os.path.join(solution_path, file_name)
-        if not os.path.exists(path):
-            df.export_csv(path)
+    # add solution files to directory. they are independent, so write them concurrently when there is more than one
+    export = partial(export_solution, solution_path=solution_path)
+    if len(solution_list) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(solution_list))) as executor:
+            list(executor.map(export, solution_list))
+    else:
+        for dfile in solution_list:
+            export(dfile)
 
 
 if __name__ == '__main__':
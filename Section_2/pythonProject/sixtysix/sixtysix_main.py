@@ -1,91 +1,76 @@
 """
 Script for parsing sixtysix files
+
+Run from the pythonProject folder with: python -m sixtysix.sixtysix_main
 """
 import numpy as np
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import pandas as pd
 import math
-import struct
 import matplotlib.pyplot as plt
 from rainbow.datafile import DataFile
 
+from common.io_utils import export_solution
+
+# each 6 byte record in file B holds a 2 byte ylabel followed by a 4 byte value, both little-endian
+B_RECORD_DTYPE = np.dtype([('y', '<u2'), ('v', '<u4')])
+
 
 def read_file_a(file_path):
     """
-    Read the file at file_path and return the xlabels, active columns, and data as numpy arrays.
+    Read the file at file_path and return the xlabels, B offsets, and active column counts as numpy arrays.
 
     :param file_path: Path to the file
 
     :return:
         xlabels: ndarray, dtype = (float, prec=4),
-        active columns: ndarray, dtype = (uint16 tuples with shape (value, length)),
-        data: numpy array of uint8 values
+        offsets: ndarray, dtype = uint32 (offset of each xlabel's data in file B),
+        num_cols: ndarray, dtype = uint16 (number of active columns for each xlabel)
     """
     name = os.path.relpath(file_path)
     print(f'\nParsing file \\{name}')
-    with open(file_path, 'rb') as f:
-        raw_bytes = f.read()
 
-    # GET XLABELS FROM COLUMNS [4:8] OF THE FILE
-    width = 10
-    # calculate the total number of rows, ensuring integer division
-    length = len(raw_bytes) // width
+    # each 10 byte row holds a 4 byte B offset, a 4 byte xlabel and a 2 byte column count, all big-endian
+    row_dtype = np.dtype([('off', '>u4'), ('x', '>u4'), ('n', '>u2')])
 
-    # create a ndarray from raw_bytes with the shape of (length, width)
-    # keeping the default dtype of uint8
+    # map the file into a structured ndarray, one record per row, reading pages on demand
     try:
-        full_array = np.frombuffer(raw_bytes, dtype='uint8').reshape(length, width)
+        rows = np.memmap(file_path, dtype=row_dtype, mode='r')
     except ValueError as e:
         print(f'Error creating full array in file {name}: {e}')
         raise ValueError(e)
 
-    # extract the xlabels from the full array, converting to rounded floats
-    # and put the first 4 columns of the full array in a data variable
-    try:
-        # create an array of the [4:8] split of each row of the full array
-        offsets, xlabels_data, num_cols = np.hsplit(full_array, [4, 8])
-
-        # create a byte buffer from the xlabels_data
-        xlabels_buffer = xlabels_data.tobytes()
-
-        # create a 1D array from the xlabels_buffer
-        xlabels_array = np.frombuffer(xlabels_buffer, dtype='>I').astype('float32') / 60000
-        # print(f'\tShape of xlabels array: {xlabels_array.shape}')
-
-        # round the xlabels_array to 4 decimal places
-        xlabels = np.round(xlabels_array, 4)
-
-    except ValueError as e:
-        print(f'Error creating xlabels array in file {name}: {e}')
-        raise ValueError(e)
-
+    # GET XLABELS FROM COLUMNS [4:8] OF THE FILE
+    # convert the xlabels to floats and round them to 4 decimal places, in place to avoid temporaries
+    xlabels = np.array(rows['x'], dtype='float32')
+    xlabels /= 60000
+    np.round(xlabels, 4, out=xlabels)
 
-    # GET DATA FROM DATA ARRAY
-    data_bytes = offsets.tobytes()
-    offsets_arr = np.frombuffer(data_bytes, dtype='>I')
+    # GET B OFFSETS AND ACTIVE COLUMN COUNTS FROM COLUMNS [0:4] AND [8:10]
+    # copy them into native arrays so nothing returned keeps the file mapped
+    offsets_arr = np.array(rows['off'], dtype=np.uint32)
+    num_cols_arr = np.array(rows['n'], dtype=np.uint16)
 
-    return xlabels, offsets_arr
+    return xlabels, offsets_arr, num_cols_arr
 
 
 def read_file_b(file_path):
     """
-    Reads a .B file, puts the data through a parsing function, and returns the transformed data.
+    Reads a .B file and returns the sorted, unique ylabels found in its records.
 
     :param file_path: Path to the file
-    :return: DataFrame of the transformed data
+    :return: ndarray of sorted unique ylabels, dtype = uint16
     """
     name = os.path.relpath(file_path)
     print(f'Parsing file \\{name}')
-    with open(file_path, 'rb') as f:
-        raw_bytes = f.read()
-        ylabels = []
-        for i in range(len(raw_bytes) // 6):
-            f.seek(i * 6)
-            value = struct.unpack('<H', f.read(2))[0]
-            if value not in ylabels:
-                ylabels.append(value)
+    # map the file rather than reading it, so its bytes are never copied onto the heap
+    raw_bytes = np.memmap(file_path, dtype=np.uint8, mode='r')
 
-        ylabels = np.sort(ylabels)
+    # view every complete record at once and keep each distinct ylabel (np.unique also sorts them)
+    records = np.frombuffer(raw_bytes, dtype=B_RECORD_DTYPE, count=len(raw_bytes) // B_RECORD_DTYPE.itemsize)
+    ylabels = np.unique(records['y'])
 
     # print(f'\tByte-length of {name}: {len(raw_bytes)}')
 
@@ -94,9 +79,9 @@ def read_file_b(file_path):
 
 def read_file_c(file_path):
     """
-    Read the file at file_path and return the data transformation key as an uint8
+    Read the file at file_path and return the data transformation key as an int
     :param file_path: Path to the file
-    :return: np.uint8 (should be Unicode character 'C' or 'B')
+    :return: int in 0..255 (should be Unicode character 'C' or 'B')
     """
     name = os.path.relpath(file_path)
     print(f'Parsing file \\{name}')
@@ -105,21 +90,21 @@ def read_file_c(file_path):
         file_format = f.read(1)
     # print the file format as a utf-8 string
     # print(f'\tFile format string: {file_format.decode("utf-8")}')
-    # print(f'\tFile format as uint8: {np.frombuffer(file_format, dtype="uint8")[0]}\n')
-    # return the file format as an uint8
-    return np.frombuffer(file_format, dtype='uint8')[0]
+    # print(f'\tFile format as int: {file_format[0]}\n')
+    # indexing bytes gives the byte as an int directly
+    return file_format[0]
 
 
 def parse_sixtysix(folder_path):
     """
     Parse the sixtysix files in the folder at folder_path. Return the xlabels, ylabels, and data as numpy arrays. \
-    Also return the key from the file C as a uint8.
+    Also return the key from the file C as an int.
     :param folder_path: Path to the folder
     :return: xlabels, ylabels, data, key
     """
     # parse files A, B, and C
     file_a_path = os.path.join(os.getcwd(), folder_path, 'sixtysix.A')
-    xlabels, offsets = read_file_a(file_a_path)
+    xlabels, offsets, num_cols_arr = read_file_a(file_a_path)
 
     file_b_path = os.path.join(os.getcwd(), folder_path, 'sixtysix.B')
     ylabels = read_file_b(file_b_path)
@@ -136,46 +121,26 @@ def parse_sixtysix(folder_path):
     The last two bytes of each 10 byte sequence in file A are the number \
     of active columns for that xlabel. 
     """
-    a = open(file_a_path, 'rb')
-    b = open(file_b_path, 'rb')
-
-    data_rows = []
-
-    # read data for each xlabel
-    for i in range(xlabels.size):
-        # get the B offset from file A
-        b_offset = struct.unpack('>I', a.read(4))[0]
-        # get the xlabel from file A
-        xlabel = np.round(((struct.unpack('>I', a.read(4))[0]) / 60000), 4)
-        # get the number of active columns from file A
-        num_cols = struct.unpack('>H', a.read(2))[0]
-
-        # make empty row
-        row_data = [0] * len(ylabels)
-
-        # move to the B offset in file B
-        b.seek(b_offset)
-        # read number of active columns from file B
-        for _ in range(num_cols):
-            # get the column number from file B
-            ylabel = struct.unpack('<H', b.read(2))[0]
-            # get the data from file B
-            value = struct.unpack('<I', b.read(4))[0]
-            # get index of ylabel in ylabels
-            index = np.where(ylabels == ylabel)[0][0]
-            # print(f'Index of {ylabel} in ylabels: {index}\n'
-            #       f'number of ylabels: {len(ylabels)}')
-            # add value to row_data at index
-            row_data[index] = value
-
-        data_rows.append(row_data)
-        # print(f'Row {xlabel} done')
-
-    # make data from second column of data_rows
-    data = np.array(data_rows)
-
-    a.close()
-    b.close()
+    # map file B so each xlabel's records are read straight from its offset, without seeking
+    b_bytes = np.memmap(file_b_path, dtype=np.uint8, mode='r')
+
+    # ylabels are uint16, so a table over every possible ylabel maps each one to its column index directly
+    ylabel_lut = np.full(1 << 16, -1, dtype=np.intp)
+    ylabel_lut[ylabels] = np.arange(ylabels.size)
+
+    # preallocate the dense data array, leaving inactive columns at zero
+    data = np.zeros((xlabels.size, ylabels.size), dtype=np.uint32)
+
+    # read data for each xlabel, using the B offsets and column counts already parsed from file A
+    for i, (b_offset, num_cols) in enumerate(zip(offsets.tolist(), num_cols_arr.tolist())):
+        # read the active columns for this xlabel, starting at the B offset in file B
+        records = np.frombuffer(b_bytes, dtype=B_RECORD_DTYPE, count=num_cols, offset=b_offset)
+        cols = ylabel_lut[records['y']]
+        # an unknown ylabel means the offset or file is bad; -1 would silently write to the last column
+        if (cols < 0).any():
+            raise ValueError(f'Error parsing {os.path.basename(file_b_path)} at offset {hex(b_offset)}: '
+                             f'unknown ylabel in row {i}')
+        data[i, cols] = records['v']
 
     return xlabels, ylabels, data, c_key
 
@@ -186,7 +151,7 @@ def main():
     :return: None
     """
     # create directory of folder paths
-    cwd = os.getcwd()
+    cwd = os.path.dirname(os.path.abspath(__file__))
     datadir_path = os.path.join(cwd, 'datadir')
     folder_paths = [os.path.join(datadir_path, folder) for folder in os.listdir(datadir_path)]
 
@@ -206,16 +171,16 @@ def main():
         print(f'\nfolder already exists at ./{os.path.basename(solution_path)}\n'
               f'\tdelete the folder to create a new one.')
 
-    # add solution files to directory
-    for df in solution_list:
-        file_name = df.name + '_solution'
-        path = os.path.join(solution_path, file_name)
-        if not os.path.exists(path):
-            df.export_csv(path)
-            print(f'wrote {file_name} to {os.path.basename(solution_path)}')
-        else:
-            print(f'{file_name} already exists in {os.path.basename(solution_path)}\n'
-                  f'\tdelete the file to write a new one.')
+    # add solution files to directory. the files are independent, so write them concurrently when there is more
+    # than one and print the messages afterwards so they stay in folder order
+    export = partial(export_solution, solution_path=solution_path)
+    if len(solution_list) > 1:
+        with ThreadPoolExecutor(max_workers=min(8, len(solution_list))) as executor:
+            messages = list(executor.map(export, solution_list))
+    else:
+        messages = [export(dfile) for dfile in solution_list]
+    for message in messages:
+        print(message)
 
 
 if __name__ == '__main__':